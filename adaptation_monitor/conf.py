@@ -16,12 +16,14 @@ SERVICE_STREAM_KEY = config('SERVICE_STREAM_KEY')
 # LISTEN_EVENT_TYPE_QUERY_CREATED = config('LISTEN_EVENT_TYPE_QUERY_CREATED')
 # LISTEN_EVENT_TYPE_QUERY_REMOVED = config('LISTEN_EVENT_TYPE_QUERY_REMOVED')
 LISTEN_EVENT_TYPE_SERVICE_WORKER_ANNOUNCED = config('LISTEN_EVENT_TYPE_SERVICE_WORKER_ANNOUNCED')
+LISTEN_EVENT_TYPE_SERVICE_WORKERS_ANNOUNCED = config('LISTEN_EVENT_TYPE_SERVICE_WORKERS_ANNOUNCED')
 LISTEN_EVENT_TYPE_REPEAT_MONITOR_STREAMS_SIZE_REQUESTED = config('LISTEN_EVENT_TYPE_REPEAT_MONITOR_STREAMS_SIZE_REQUESTED')
 
 SERVICE_CMD_KEY_LIST = [
     # LISTEN_EVENT_TYPE_QUERY_CREATED,
     # LISTEN_EVENT_TYPE_QUERY_REMOVED,
     LISTEN_EVENT_TYPE_SERVICE_WORKER_ANNOUNCED,
+    LISTEN_EVENT_TYPE_SERVICE_WORKERS_ANNOUNCED,
     LISTEN_EVENT_TYPE_REPEAT_MONITOR_STREAMS_SIZE_REQUESTED,
 ]
 
@@ -34,6 +36,31 @@ PUB_EVENT_LIST = [
 ]
 
 
+# max number of cmd events read at once, announced workers from the same read are applied to the registry in one step
+SERVICE_CMD_READ_BATCH_SIZE = config('SERVICE_CMD_READ_BATCH_SIZE', default=100, cast=int)
+
+# retention for the published streams, applied at write time. 0 disables the bound.
+# MAXLEN is approximate (XTRIM MAXLEN ~), the MINID window is in seconds (XTRIM MINID ~, requires redis >= 6.2)
+REPEAT_MONITOR_STREAMS_SIZE_REQUESTED_STREAM_MAXLEN = config(
+    'REPEAT_MONITOR_STREAMS_SIZE_REQUESTED_STREAM_MAXLEN', default=100, cast=int)
+REPEAT_MONITOR_STREAMS_SIZE_REQUESTED_STREAM_MINID_WINDOW = config(
+    'REPEAT_MONITOR_STREAMS_SIZE_REQUESTED_STREAM_MINID_WINDOW', default=0, cast=int)
+SERVICE_WORKERS_STREAM_MONITORED_STREAM_MAXLEN = config(
+    'SERVICE_WORKERS_STREAM_MONITORED_STREAM_MAXLEN', default=1000, cast=int)
+SERVICE_WORKERS_STREAM_MONITORED_STREAM_MINID_WINDOW = config(
+    'SERVICE_WORKERS_STREAM_MONITORED_STREAM_MINID_WINDOW', default=0, cast=int)
+
+PUB_STREAMS_RETENTION = {
+    PUB_EVENT_TYPE_REPEAT_MONITOR_STREAMS_SIZE_REQUESTED: {
+        'maxlen': REPEAT_MONITOR_STREAMS_SIZE_REQUESTED_STREAM_MAXLEN,
+        'minid_window': REPEAT_MONITOR_STREAMS_SIZE_REQUESTED_STREAM_MINID_WINDOW,
+    },
+    PUB_EVENT_TYPE_SERVICE_WORKERS_STREAM_MONITORED: {
+        'maxlen': SERVICE_WORKERS_STREAM_MONITORED_STREAM_MAXLEN,
+        'minid_window': SERVICE_WORKERS_STREAM_MONITORED_STREAM_MINID_WINDOW,
+    },
+}
+
 SERVICE_DETAILS = None
 
 LOGGING_LEVEL = config('LOGGING_LEVEL', default='DEBUG')
@@ -13,6 +13,8 @@ from adaptation_monitor.conf import (
     TRACER_REPORTING_HOST,
     TRACER_REPORTING_PORT,
     SERVICE_DETAILS,
+    SERVICE_CMD_READ_BATCH_SIZE,
+    PUB_STREAMS_RETENTION,
 )
 
 
@@ -29,7 +31,9 @@ def run_service():
         service_details=SERVICE_DETAILS,
         stream_factory=stream_factory,
         logging_level=LOGGING_LEVEL,
-        tracer_configs=tracer_configs
+        tracer_configs=tracer_configs,
+        cmd_read_batch_size=SERVICE_CMD_READ_BATCH_SIZE,
+        pub_streams_retention=PUB_STREAMS_RETENTION,
     )
     service.run()
 
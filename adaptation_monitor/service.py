@@ -8,7 +8,13 @@ from event_service_utils.services.event_driven import BaseEventDrivenCMDService,
 from event_service_utils.tracing.jaeger import init_tracer
 from walrus.containers import make_python_attr
 
-from .streams import get_total_pending_cg_stream_with_lua, register_lua_script
+from .streams import (
+    get_total_pending_cg_stream_with_lua,
+    register_lua_script,
+    trim_stream_by_min_id_window,
+    get_redis_clock_offset,
+    is_minid_trim_supported
+)
 
 
 class AdaptationMonitor(BaseEventDrivenCMDService):
@@ -17,7 +23,9 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
                  pub_event_list, service_details,
                  stream_factory,
                  logging_level,
-                 tracer_configs):
+                 tracer_configs,
+                 cmd_read_batch_size=1,
+                 pub_streams_retention=None):
         tracer = init_tracer(self.__class__.__name__, **tracer_configs)
         super(AdaptationMonitor, self).__init__(
             name=self.__class__.__name__,
@@ -35,18 +43,122 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
         self.count_stream_size_xrange_script = None
         self.published_empty_service_workers_stream = False
         self.services_to_monitor = {}
+        self.services_to_monitor_lock = threading.Lock()
+        self.cmd_read_batch_size = cmd_read_batch_size
+        self.announced_service_workers_batch = []
+        if pub_streams_retention is None:
+            pub_streams_retention = {}
+        self.pub_streams_retention = pub_streams_retention
+        self.pub_streams_retention_stats = {}
+        self.pub_streams_retention_stats_lock = threading.Lock()
+        self.minid_trim_supported = None
+        self.redis_clock_offset = 0
+        self.setup_pub_streams_retention()
 
     def publish_service_workers_stream_monitored(self, service_workers):
+        event_type = 'ServiceWorkersStreamMonitored'
         new_event_data = {
             'service_workers': service_workers
         }
         new_event_data['id'] = self.service_based_random_event_id()
-        self.publish_event_type_to_stream(event_type='ServiceWorkersStreamMonitored', new_event_data=new_event_data)
+        self.publish_event_type_to_stream(event_type=event_type, new_event_data=new_event_data)
+        self.apply_pub_stream_retention(event_type)
+
+    def setup_pub_streams_retention(self):
+        for stream_key, retention in self.pub_streams_retention.items():
+            pub_stream = self.pub_event_stream_map.get(stream_key)
+            if pub_stream is None:
+                self.logger.warning(f'Ignoring retention for stream not in the published event types: {stream_key}')
+                continue
+
+            self.pub_streams_retention_stats[stream_key] = {
+                'writes': 0, 'trimmed_events': 0, 'trim_errors': 0, 'length': None
+            }
+            maxlen = retention.get('maxlen', 0)
+            if maxlen > 0:
+                # MAXLEN ~ is applied by redis in the XADD itself
+                pub_stream.default_write_kwargs = {'maxlen': maxlen, 'approximate': True}
+
+    def check_minid_trim_support(self):
+        if self.minid_trim_supported is not None:
+            return self.minid_trim_supported
+
+        redis_db = self.stream_factory.redis_db
+        try:
+            self.minid_trim_supported = is_minid_trim_supported(redis_db)
+            if self.minid_trim_supported:
+                self.redis_clock_offset = get_redis_clock_offset(redis_db)
+        except Exception as e:
+            self.logger.exception(e)
+            self.minid_trim_supported = False
+
+        uses_minid = any(r.get('minid_window', 0) > 0 for r in self.pub_streams_retention.values())
+        if uses_minid and not self.minid_trim_supported:
+            self.logger.warning('Redis server does not support XTRIM MINID (requires >= 6.2), MINID retention disabled.')
+        return self.minid_trim_supported
+
+    def apply_pub_stream_retention(self, stream_key):
+        if stream_key not in self.pub_streams_retention_stats:
+            return
+
+        trimmed = 0
+        trim_error = False
+        minid_window = self.pub_streams_retention[stream_key].get('minid_window', 0)
+        if minid_window > 0 and self.check_minid_trim_support():
+            try:
+                trimmed = trim_stream_by_min_id_window(
+                    self.stream_factory.redis_db, stream_key, minid_window, clock_offset=self.redis_clock_offset
+                )
+            except Exception as e:
+                self.logger.exception(e)
+                trim_error = True
+
+        with self.pub_streams_retention_stats_lock:
+            stats = self.pub_streams_retention_stats[stream_key]
+            stats['writes'] += 1
+            stats['trimmed_events'] += trimmed
+            if trim_error:
+                stats['trim_errors'] += 1
+
+    def refresh_pub_streams_lengths(self):
+        redis_db = self.stream_factory.redis_db
+        for stream_key in list(self.pub_streams_retention_stats.keys()):
+            try:
+                length = redis_db.xlen(stream_key)
+            except Exception as e:
+                self.logger.error(f'Could not get length of stream "{stream_key}": {e}')
+                length = None
+            with self.pub_streams_retention_stats_lock:
+                self.pub_streams_retention_stats[stream_key]['length'] = length
+
+    def get_pub_streams_retention_stats(self):
+        with self.pub_streams_retention_stats_lock:
+            return copy.deepcopy(self.pub_streams_retention_stats)
 
     def process_new_service_worker_monitoring(self, worker, service_type, stream_key):
         service_dict = self.services_to_monitor.setdefault(service_type, {'workers': {}})
         service_dict['workers'][stream_key] = worker
 
+    def add_announced_service_workers_to_batch(self, workers):
+        if not isinstance(workers, list):
+            self.logger.error(f'Ignoring announced service workers that are not a list: {workers}')
+            return
+        self.announced_service_workers_batch.extend(workers)
+
+    def process_announced_service_workers(self, workers):
+        valid_workers = []
+        for worker in workers:
+            if not isinstance(worker, dict) or 'service_type' not in worker or 'stream_key' not in worker:
+                self.logger.error(f'Ignoring announced service worker without "service_type" or "stream_key": {worker}')
+                continue
+            valid_workers.append(worker)
+
+        with self.services_to_monitor_lock:
+            for worker in valid_workers:
+                self.process_new_service_worker_monitoring(
+                    worker=worker, service_type=worker['service_type'], stream_key=worker['stream_key']
+                )
+
     def _repeat_event_type_after_time(self, event_type, event_data, wait_time):
         if wait_time < 0:
             self.logger.debug(f'Will not repeat action.')
@@ -83,7 +195,8 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
         )
 
     def process_stream_size_monitoring(self):
-        service_workers = copy.deepcopy(self.services_to_monitor)
+        with self.services_to_monitor_lock:
+            service_workers = copy.deepcopy(self.services_to_monitor)
         for service_type, service in service_workers.items():
             workers = service['workers']
             for stream_key, worker in workers.items():
@@ -101,6 +214,8 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
             total_number_workers = len(workers.keys())
             service['total_number_workers'] = total_number_workers
 
+        self.refresh_pub_streams_lengths()
+
         # don't publish empty dict more than once
         if len(service_workers.keys()) == 0:
             if self.published_empty_service_workers_stream:
@@ -137,11 +252,14 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
         if not super(AdaptationMonitor, self).process_event_type(event_type, event_data, json_msg):
             return False
 
+        # announced workers are only collected here, and applied once per cmd read in process_cmd
         if event_type == 'ServiceWorkerAnnounced':
             worker = event_data['worker']
-            service_type = worker['service_type']
-            stream_key = worker['stream_key']
-            self.process_new_service_worker_monitoring(worker=worker, service_type=service_type, stream_key=stream_key)
+            self.add_announced_service_workers_to_batch(workers=[worker])
+
+        elif event_type == 'ServiceWorkersAnnounced':
+            workers = event_data['workers']
+            self.add_announced_service_workers_to_batch(workers=workers)
 
         elif event_type == 'RepeatMonitorStreamsSizeRequested':
             repeat_after_time = event_data['repeat_after_time']
@@ -149,9 +267,40 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
         # elif event_type == 'QueryCreated':
         #     pass
 
+    def process_cmd(self, cg_sub_group=None):
+        if cg_sub_group is None:
+            cg_sub_group = 'default'
+
+        cmd_stream = self.service_cmd_cg_stream_map[cg_sub_group]
+        event_types = self.service_cmd_cg_keys_map[cg_sub_group]
+
+        self.logger.debug(f'Processing CMD-[{cg_sub_group}] from event types: {event_types}')
+
+        stream_event_list = cmd_stream.read_stream_events_list(count=self.cmd_read_batch_size)
+        for stream_key, event_tuple_list in stream_event_list:
+            event_type = stream_key.decode('utf-8')
+            for event_id, json_msg in event_tuple_list:
+                try:
+                    event_data = self.default_event_deserializer(json_msg)
+                    self.process_event_type_wrapper(cg_sub_group, event_type, event_data, json_msg)
+                except Exception as e:
+                    self.logger.error(f'Error processing {json_msg}:')
+                    self.logger.exception(e)
+
+        workers = self.announced_service_workers_batch
+        self.announced_service_workers_batch = []
+        if len(workers) != 0:
+            self.process_announced_service_workers(workers)
+        self.log_state()
+
     def log_state(self):
         super(AdaptationMonitor, self).log_state()
-        self._log_dict('Services To Monitor', self.services_to_monitor)
+        with self.services_to_monitor_lock:
+            total_workers_per_service = {
+                service_type: len(service['workers']) for service_type, service in self.services_to_monitor.items()
+            }
+        self._log_dict('Total Workers Per Service To Monitor', total_workers_per_service)
+        self._log_dict('Published Streams Retention', self.get_pub_streams_retention_stats())
 
     def repeat_services_monitoring_for_stream_check(self):
         time.sleep(1)
@@ -172,9 +321,11 @@ class AdaptationMonitor(BaseEventDrivenCMDService):
 
         self.logger.info(f'Publishing without trace "{event_type}" entity: {new_event_data}')
         pub_stream.write_events(self.default_event_serializer(new_event_data))
+        self.apply_pub_stream_retention(event_type)
 
     def run(self):
         super(AdaptationMonitor, self).run()
+        self.check_minid_trim_support()
         self.cmd_thread = threading.Thread(target=self.run_forever, args=(self.process_cmd,))
         self.cmd_thread.start()
 
@@ -1,5 +1,8 @@
+import time
+
 import redis
 
+
 def get_total_pending_cg_stream(redis_db, stream_key):
     bad_return_value = redis_db.xlen(stream_key)
     cg_name = f'cg-{stream_key}'
@@ -84,3 +87,22 @@ def get_total_pending_cg_stream_with_lua(redis_db, lua_script, stream_key):
         total_pending = bad_return_value
 
     return total_pending
+
+
+def get_redis_clock_offset(redis_db):
+    # stream entries ids come from the redis server clock, which may differ from this host clock
+    seconds, microseconds = redis_db.time()
+    return seconds + microseconds / 1000000 - time.time()
+
+
+def trim_stream_by_min_id_window(redis_db, stream_key, window, clock_offset=0):
+    redis_now = time.time() + clock_offset
+    min_id = f'{int((redis_now - window) * 1000)}-0'
+    # XTRIM MINID is only available from redis 6.2 onwards, and not wrapped by redis-py 3.x
+    return redis_db.execute_command('XTRIM', stream_key, 'MINID', '~', min_id)
+
+
+def is_minid_trim_supported(redis_db):
+    redis_version = redis_db.info('server')['redis_version']
+    major, minor = [int(v) for v in redis_version.split('.')[:2]]
+    return (major, minor) >= (6, 2)
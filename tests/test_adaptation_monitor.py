@@ -1,4 +1,4 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from event_service_utils.tests.base_test_case import MockedEventDrivenServiceStreamTestCase
 from event_service_utils.tests.json_msg_helper import prepare_event_msg_tuple
@@ -31,6 +31,11 @@ class TestAdaptationMonitor(MockedEventDrivenServiceStreamTestCase):
         'cg-AdaptationMonitor': MOCKED_CG_STREAM_DICT,
     }
 
+    def setUp(self):
+        super(TestAdaptationMonitor, self).setUp()
+        # the mocked stream factory has no redis connection, used directly for the streams retention
+        self.service.stream_factory.redis_db = MagicMock()
+
     @patch('adaptation_monitor.service.AdaptationMonitor.process_event_type')
     def test_process_cmd_should_call_process_event_type(self, mocked_process_event_type):
         event_type = 'SomeEventType'
@@ -50,6 +55,218 @@ class TestAdaptationMonitor(MockedEventDrivenServiceStreamTestCase):
         self.assertTrue(mocked_process_event_type.called)
         self.service.process_event_type.assert_called_once_with(event_type=event_type, event_data=event_data, json_msg=msg_tuple[1])
 
+    def test_process_event_type_should_collect_bulk_service_workers_announced(self):
+        event_type = 'ServiceWorkersAnnounced'
+        workers = [
+            {'service_type': 'ObjectDetection', 'stream_key': 'objworker-key'},
+            {'service_type': 'ObjectDetection', 'stream_key': 'objworker-key2'},
+        ]
+        event_data = {
+            'id': 1,
+            'workers': workers,
+        }
+        msg_tuple = prepare_event_msg_tuple(event_data)
+        self.service.process_event_type(event_type, event_data, msg_tuple[1])
+        self.assertListEqual(self.service.announced_service_workers_batch, workers)
+        self.assertDictEqual(self.service.services_to_monitor, {})
+
+    @patch('adaptation_monitor.service.AdaptationMonitor.log_state')
+    @patch('adaptation_monitor.service.AdaptationMonitor.process_announced_service_workers')
+    def test_process_cmd_should_apply_announced_workers_from_same_read_in_one_step(self, mocked_process_announced, mocked_log_state):
+        workers = [
+            {'service_type': 'ObjectDetection', 'stream_key': f'objworker-key{i}'} for i in range(3)
+        ]
+        bulk_workers = [
+            {'service_type': 'ColorDetection', 'stream_key': f'clrworker-key{i}'} for i in range(2)
+        ]
+        self.service.cmd_read_batch_size = 3
+        # the mocked cmd stream pops "count" values from every stream key, None is skipped
+        self.service.service_cmd.mocked_values_dict = {
+            b'ServiceWorkerAnnounced': [
+                prepare_event_msg_tuple({'id': i, 'worker': worker}) for i, worker in enumerate(workers)
+            ],
+            b'ServiceWorkersAnnounced': [
+                prepare_event_msg_tuple({'id': 10, 'workers': bulk_workers}), None, None
+            ],
+        }
+        self.service.process_cmd()
+
+        mocked_process_announced.assert_called_once_with(workers + bulk_workers)
+        self.assertEqual(mocked_log_state.call_count, 1)
+        self.assertListEqual(self.service.announced_service_workers_batch, [])
+
+    def test_process_announced_service_workers_should_add_workers_to_registry(self):
+        worker = {'service_type': 'ObjectDetection', 'stream_key': 'objworker-key'}
+        worker2 = {'service_type': 'ColorDetection', 'stream_key': 'clrworker-key'}
+        self.service.process_announced_service_workers(workers=[worker, worker2])
+        expected_registry = {
+            'ObjectDetection': {'workers': {'objworker-key': worker}},
+            'ColorDetection': {'workers': {'clrworker-key': worker2}},
+        }
+        self.assertDictEqual(self.service.services_to_monitor, expected_registry)
+
+    def test_process_cmd_should_drop_only_malformed_workers_from_bulk_announced(self):
+        worker = {'service_type': 'ObjectDetection', 'stream_key': 'objworker-key'}
+        malformed_worker = {'service_type': 'ObjectDetection'}
+        worker2 = {'service_type': 'ColorDetection', 'stream_key': 'clrworker-key'}
+        event_data = {
+            'id': 1,
+            'workers': [worker, malformed_worker, worker2],
+        }
+        self.service.service_cmd.mocked_values_dict = {
+            b'ServiceWorkersAnnounced': [prepare_event_msg_tuple(event_data)]
+        }
+        self.service.process_cmd()
+        expected_registry = {
+            'ObjectDetection': {'workers': {'objworker-key': worker}},
+            'ColorDetection': {'workers': {'clrworker-key': worker2}},
+        }
+        self.assertDictEqual(self.service.services_to_monitor, expected_registry)
+
+    def test_process_event_type_should_ignore_workers_not_in_a_list(self):
+        event_data = {
+            'id': 1,
+            'workers': {'service_type': 'ObjectDetection', 'stream_key': 'objworker-key'},
+        }
+        msg_tuple = prepare_event_msg_tuple(event_data)
+        self.service.process_event_type('ServiceWorkersAnnounced', event_data, msg_tuple[1])
+        self.assertListEqual(self.service.announced_service_workers_batch, [])
+
+    @patch('adaptation_monitor.service.AdaptationMonitor.publish_service_workers_stream_monitored')
+    @patch('adaptation_monitor.service.AdaptationMonitor.calculate_stream_pending_len')
+    def test_process_stream_size_monitoring_should_publish_registry_snapshot(self, mocked_pending_len, mocked_pub):
+        mocked_pending_len.return_value = 0
+        worker = {'service_type': 'ObjectDetection', 'stream_key': 'objworker-key', 'queue_limit': 10}
+        self.service.process_announced_service_workers(workers=[worker])
+
+        self.service.process_stream_size_monitoring()
+        service_workers = mocked_pub.call_args[0][0]
+        self.assertEqual(service_workers['ObjectDetection']['workers']['objworker-key']['queue_space'], 10)
+        self.assertEqual(service_workers['ObjectDetection']['total_number_workers'], 1)
+        self.assertNotIn('queue_space', self.service.services_to_monitor['ObjectDetection']['workers']['objworker-key'])
+
+    def set_pub_streams_retention(self, pub_streams_retention):
+        self.service.pub_streams_retention = pub_streams_retention
+        self.service.pub_streams_retention_stats = {}
+        self.service.setup_pub_streams_retention()
+
+    def test_setup_pub_streams_retention_should_set_maxlen_on_pub_stream_writes(self):
+        self.set_pub_streams_retention({
+            'ServiceWorkersStreamMonitored': {'maxlen': 1000, 'minid_window': 0},
+            'RepeatMonitorStreamsSizeRequested': {'maxlen': 0, 'minid_window': 0},
+        })
+        self.assertDictEqual(
+            self.service.pub_event_stream_map['ServiceWorkersStreamMonitored'].default_write_kwargs,
+            {'maxlen': 1000, 'approximate': True}
+        )
+        self.assertFalse(
+            hasattr(self.service.pub_event_stream_map['RepeatMonitorStreamsSizeRequested'], 'default_write_kwargs')
+        )
+
+    def test_setup_pub_streams_retention_should_warn_about_unknown_streams(self):
+        with patch.object(self.service.logger, 'warning') as mocked_warning:
+            self.set_pub_streams_retention({
+                'RenamedStreamMonitored': {'maxlen': 1000, 'minid_window': 0},
+            })
+        self.assertEqual(mocked_warning.call_count, 1)
+        self.assertDictEqual(self.service.pub_streams_retention_stats, {})
+
+    @patch('adaptation_monitor.service.trim_stream_by_min_id_window')
+    def test_apply_pub_stream_retention_should_trim_by_minid_and_update_stats(self, mocked_trim_minid):
+        mocked_trim_minid.return_value = 2
+        self.set_pub_streams_retention({
+            'ServiceWorkersStreamMonitored': {'maxlen': 1000, 'minid_window': 60},
+        })
+        self.service.minid_trim_supported = True
+        self.service.redis_clock_offset = 0.5
+        self.service.apply_pub_stream_retention('ServiceWorkersStreamMonitored')
+
+        mocked_trim_minid.assert_called_once_with(
+            self.service.stream_factory.redis_db, 'ServiceWorkersStreamMonitored', 60, clock_offset=0.5)
+        self.assertDictEqual(
+            self.service.pub_streams_retention_stats['ServiceWorkersStreamMonitored'],
+            {'writes': 1, 'trimmed_events': 2, 'trim_errors': 0, 'length': None}
+        )
+
+    @patch('adaptation_monitor.service.trim_stream_by_min_id_window')
+    def test_apply_pub_stream_retention_should_count_trim_errors(self, mocked_trim_minid):
+        mocked_trim_minid.side_effect = Exception('some redis error')
+        self.set_pub_streams_retention({
+            'ServiceWorkersStreamMonitored': {'maxlen': 0, 'minid_window': 60},
+        })
+        self.service.minid_trim_supported = True
+        with patch.object(self.service.logger, 'exception'):
+            self.service.apply_pub_stream_retention('ServiceWorkersStreamMonitored')
+
+        self.assertDictEqual(
+            self.service.pub_streams_retention_stats['ServiceWorkersStreamMonitored'],
+            {'writes': 1, 'trimmed_events': 0, 'trim_errors': 1, 'length': None}
+        )
+
+    @patch('adaptation_monitor.service.trim_stream_by_min_id_window')
+    def test_apply_pub_stream_retention_should_skip_disabled_bounds(self, mocked_trim_minid):
+        self.set_pub_streams_retention({
+            'RepeatMonitorStreamsSizeRequested': {'maxlen': 0, 'minid_window': 0},
+        })
+        self.service.apply_pub_stream_retention('RepeatMonitorStreamsSizeRequested')
+        self.service.apply_pub_stream_retention('SomeOtherStream')
+
+        self.assertFalse(mocked_trim_minid.called)
+        self.assertEqual(self.service.pub_streams_retention_stats['RepeatMonitorStreamsSizeRequested']['writes'], 1)
+        self.assertNotIn('SomeOtherStream', self.service.pub_streams_retention_stats)
+
+    @patch('adaptation_monitor.service.trim_stream_by_min_id_window')
+    @patch('adaptation_monitor.service.is_minid_trim_supported')
+    def test_apply_pub_stream_retention_should_disable_minid_once_if_unsupported(self, mocked_supported, mocked_trim_minid):
+        mocked_supported.return_value = False
+        self.set_pub_streams_retention({
+            'ServiceWorkersStreamMonitored': {'maxlen': 0, 'minid_window': 60},
+        })
+        with patch.object(self.service.logger, 'warning') as mocked_warning:
+            self.service.apply_pub_stream_retention('ServiceWorkersStreamMonitored')
+            self.service.apply_pub_stream_retention('ServiceWorkersStreamMonitored')
+
+        self.assertEqual(mocked_supported.call_count, 1)
+        self.assertEqual(mocked_warning.call_count, 1)
+        self.assertFalse(mocked_trim_minid.called)
+        self.assertEqual(self.service.pub_streams_retention_stats['ServiceWorkersStreamMonitored']['writes'], 2)
+
+    @patch('adaptation_monitor.service.AdaptationMonitor.apply_pub_stream_retention')
+    def test_publish_event_type_to_stream_without_trace_should_write_to_pub_stream(self, mocked_retention):
+        new_event_data = {'id': 1, 'repeat_after_time': 1}
+        self.service.publish_event_type_to_stream_without_trace(
+            event_type='RepeatMonitorStreamsSizeRequested', new_event_data=new_event_data
+        )
+        pub_stream = self.service.pub_event_stream_map['RepeatMonitorStreamsSizeRequested']
+        self.assertIn(self.service.default_event_serializer(new_event_data), pub_stream.mocked_values)
+        mocked_retention.assert_called_once_with('RepeatMonitorStreamsSizeRequested')
+
+    @patch('adaptation_monitor.service.AdaptationMonitor.apply_pub_stream_retention')
+    @patch('adaptation_monitor.service.AdaptationMonitor.publish_event_type_to_stream')
+    def test_publish_service_workers_stream_monitored_should_apply_retention(self, mocked_pub, mocked_retention):
+        self.service.publish_service_workers_stream_monitored({})
+        event_type = mocked_pub.call_args[1]['event_type']
+        self.assertEqual(event_type, 'ServiceWorkersStreamMonitored')
+        mocked_retention.assert_called_once_with(event_type)
+
+    def test_refresh_pub_streams_lengths_should_update_cached_stream_length(self):
+        self.set_pub_streams_retention({
+            'ServiceWorkersStreamMonitored': {'maxlen': 1000, 'minid_window': 0},
+            'RepeatMonitorStreamsSizeRequested': {'maxlen': 100, 'minid_window': 0},
+        })
+        mocked_redis_db = MagicMock()
+        mocked_redis_db.xlen.side_effect = lambda key: {'ServiceWorkersStreamMonitored': 1000}[key]
+        with patch.object(self.service.stream_factory, 'redis_db', mocked_redis_db):
+            self.service.refresh_pub_streams_lengths()
+            streams_stats = self.service.get_pub_streams_retention_stats()
+            self.service.get_pub_streams_retention_stats()
+
+        self.assertEqual(mocked_redis_db.xlen.call_count, 2)
+        self.assertDictEqual(
+            streams_stats['ServiceWorkersStreamMonitored'],
+            {'writes': 0, 'trimmed_events': 0, 'trim_errors': 0, 'length': 1000}
+        )
+        self.assertIsNone(streams_stats['RepeatMonitorStreamsSizeRequested']['length'])
 
     # @patch('adaptation_monitor.service.AdaptationMonitor.process_update_controlflow_monitoring')
     # def test_process_action_should_process_add_query_monitoring(self, mocked_up_ctrlflow_mon):
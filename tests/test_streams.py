@@ -0,0 +1,37 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from adaptation_monitor.streams import (
+    get_redis_clock_offset,
+    trim_stream_by_min_id_window,
+    is_minid_trim_supported
+)
+
+
+class TestStreams(TestCase):
+
+    @patch('adaptation_monitor.streams.time.time')
+    def test_get_redis_clock_offset_should_use_redis_server_clock(self, mocked_time):
+        mocked_time.return_value = 998.0
+        redis_db = MagicMock()
+        redis_db.time.return_value = (1000, 500000)
+        self.assertEqual(get_redis_clock_offset(redis_db), 2.5)
+
+    @patch('adaptation_monitor.streams.time.time')
+    def test_trim_stream_by_min_id_window_should_apply_clock_offset(self, mocked_time):
+        mocked_time.return_value = 998.0
+        redis_db = MagicMock()
+        redis_db.execute_command.return_value = 2
+        trimmed = trim_stream_by_min_id_window(redis_db, 'some-stream', 60, clock_offset=2.5)
+        redis_db.execute_command.assert_called_once_with('XTRIM', 'some-stream', 'MINID', '~', '940500-0')
+        self.assertEqual(trimmed, 2)
+        self.assertFalse(redis_db.time.called)
+
+    def test_is_minid_trim_supported_should_require_redis_6_2(self):
+        redis_db = MagicMock()
+        redis_db.info.return_value = {'redis_version': '5.0.3'}
+        self.assertFalse(is_minid_trim_supported(redis_db))
+        redis_db.info.return_value = {'redis_version': '6.2.0'}
+        self.assertTrue(is_minid_trim_supported(redis_db))
+        redis_db.info.return_value = {'redis_version': '7.0.11'}
+        self.assertTrue(is_minid_trim_supported(redis_db))